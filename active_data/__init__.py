@@ -12,7 +12,6 @@ from __future__ import unicode_literals
 
 from mo_dots import wrap
 from mo_files import File
-from mo_json import value2json
 from mo_logs import Log
 from mo_times.dates import Date
 
@@ -36,12 +35,12 @@ def record_request(request, query_, data, error):
             "path": request.headers.environ["werkzeug.request"].full_path,
             "content_length": request.headers.get("content_length"),
             "remote_addr": request.remote_addr,
-            "query_text": value2json(query_),
+            "query_text": query_,  # THE REQUEST TEXT, THE PARSED QUERY IS CHANGED AS IT IS RUN
             "data": data,
             "error": error
         })
         log["from"] = request.headers.get('from')
-        request_log_queue.add({"value": log})
+        request_log_queue.add(log)
     except Exception as e:
         Log.warning("Can not record", cause=e)
 
@@ -11,6 +11,8 @@ from __future__ import division
 from __future__ import unicode_literals
 
 from collections import Mapping
+from itertools import chain
+from time import time
 
 import flask
 from flask import Response
@@ -18,18 +20,23 @@ from future.utils import text_type
 
 import jx_elasticsearch
 from active_data import record_request
-from active_data.actions import save_query
+from active_data.actions import save_query, query_cache, admission, binary
 from jx_base import container
-from mo_dots import coalesce, split_field, set_default
+from mo_dots import coalesce, split_field, set_default, unwrap
+from mo_future import generator_types
 from mo_json import value2json
 from mo_json.typed_encoder import STRUCT
-from mo_logs import Log, strings
+from mo_logs import Log, strings, Except
 from mo_logs.strings import expand_template, unicode2utf8
+from mo_math import Math
 from mo_threads import Till
 from mo_times.dates import Date
 from mo_times.durations import MINUTE
+from pyLibrary import trace
+from pyLibrary.env import elasticsearch
 
 QUERY_TOO_LARGE = "Query is too large"
+STREAM_BATCH_SIZE = 1000  # NUMBER OF data ROWS SERIALIZED AT A TIME
 
 
 def send_error(active_data_timer, body, e):
@@ -37,6 +44,8 @@ def send_error(active_data_timer, body, e):
 
     if QUERY_TOO_LARGE in e:
         status = 413
+    elif admission.QUERY_BUSY in e:
+        status = 429
 
     record_request(flask.request, None, body, e)
     Log.warning("Could not process\n{{body}}", body=body.decode("latin1"), cause=e)
@@ -56,6 +65,140 @@ def send_error(active_data_timer, body, e):
     )
 
 
+def stream_response(result, query_timer, cache_key=None):
+    """
+    GENERATOR OF utf8 BYTES OF THE JSON-IZED result
+
+    THE data IS SERIALIZED A BATCH OF ROWS AT A TIME, SO THE PEAK MEMORY IS
+    BOUNDED BY THE BATCH SIZE.  THE meta IS SENT LAST, SO IT CAN INCLUDE THE
+    TOTAL TIME AND THE TIME SPENT SERIALIZING.  A FAILURE PART WAY THROUGH
+    IS REPORTED AS AN error PROPERTY
+
+    :param result: THE QUERY RESULT (Data, OR OBJECT WITH __data__())
+    :param query_timer: THE Timer STARTED WHEN THE REQUEST ARRIVED
+    :param cache_key: OPTIONAL (key, version) TO STORE THE RESPONSE IN THE query_cache
+    """
+    start = time()
+    num_bytes = 0
+    cache = query_cache.cache if cache_key else None
+    body = [] if cache else None  # COPY OF THE SENT BYTES, FOR THE CACHE
+    if not isinstance(result, Mapping) and hasattr(result, "__data__"):
+        result = result.__data__()
+    result = unwrap(result)  # AVOID wrap(), WHICH WOULD PULL A data GENERATOR INTO MEMORY
+    meta = result.get("meta")
+    traced = trace.spent(meta)  # STREAMED PAGES ADD TO THE trace AS THE data IS SENT
+
+    serializer = binary.serializers.get((meta or {}).get("content_type"))
+    if serializer:
+        # BINARY FORMATS ARE NOT CACHED
+        for chunk in serializer(result, query_timer):
+            yield chunk
+        return
+
+    prefix = "{"
+    closer = b""  # WHAT IS NEEDED TO CLOSE A PARTIALLY SENT VALUE, SHOULD THERE BE A FAILURE
+    try:
+        for k, v in result.items():
+            if k == "meta":
+                continue
+            head = unicode2utf8(prefix + value2json(k) + ":")
+            prefix = ","
+            if isinstance(v, (list,) + generator_types):
+                # data ROWS
+                chunks, end = chain([head], _stream_list(v)), b"]"
+            elif isinstance(v, Mapping):
+                # CUBE COLUMNS
+                chunks, end = chain([head], _stream_dict(v)), b"}"
+            else:
+                chunks, end = [head + unicode2utf8(value2json(v))], b""
+
+            closer = b""
+            for i, chunk in enumerate(chunks):
+                num_bytes += len(chunk)
+                if body is not None:
+                    if num_bytes > cache.max_entry_bytes:
+                        body = None  # TOO BIG TO CACHE
+                    else:
+                        body.append(chunk)
+                yield chunk
+                closer = end if i else b"null"
+            closer = b""
+    except Exception as e:
+        e = Except.wrap(e)
+        Log.warning("Problem streaming response after {{num}} bytes", num=num_bytes, cause=e)
+        yield closer + unicode2utf8(prefix + "\"error\":" + value2json(e) + "}")
+        return
+
+    if body is not None:
+        key, version = cache_key
+        cache.set(key, version, {k: v for k, v in (meta or {}).items() if k != "timing"}, b"".join(body))
+
+    end = time()
+    timing = {
+        "total": Math.round(end - query_timer.start, digits=4),
+        "jsonification": Math.round(end - start, digits=4)
+    }
+    trace.add_after(meta, "jsonification", end - start - (trace.spent(meta) - traced))
+    if cache:
+        timing["cache"] = cache.stats()
+    timing["pools"] = [c.pool.stats() for c in elasticsearch.known_clusters.values()]
+    meta = set_default({"timing": timing}, meta)
+    Log.note("Response is {{num}} bytes in {{duration}} seconds", num=num_bytes, duration=timing["total"])
+    yield unicode2utf8(prefix + "\"meta\":" + value2json(meta) + "}")
+
+
+def replay_response(entry, query_timer, timing):
+    """
+    GENERATOR OF utf8 BYTES FOR A RESPONSE FOUND IN THE query_cache
+
+    :param entry: THE CACHE ENTRY, WITH meta AND body
+    :param query_timer: THE Timer STARTED WHEN THE REQUEST ARRIVED
+    :param timing: TIMING COLLECTED SO FAR
+    """
+    yield entry.body
+    prefix = "," if len(entry.body) > 1 else ""
+    timing = set_default(
+        {
+            "total": Math.round(time() - query_timer.start, digits=4),
+            "cache": query_cache.cache.stats(entry)
+        },
+        timing
+    )
+    meta = set_default({"timing": timing}, entry.meta)
+    yield unicode2utf8(prefix + "\"meta\":" + value2json(meta) + "}")
+
+
+def _stream_list(rows):
+    """
+    :param rows: ITERABLE OF ROWS
+    :return: GENERATOR OF utf8 BYTES FOR THE JSON ARRAY OF rows
+    """
+    sep = b"["
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= STREAM_BATCH_SIZE:
+            yield sep + unicode2utf8(value2json(batch)[1:-1])
+            sep = b","
+            batch = []
+    if batch:
+        yield sep + unicode2utf8(value2json(batch)[1:-1])
+        sep = b","
+    yield b"]" if sep == b"," else b"[]"
+
+
+def _stream_dict(columns):
+    """
+    :param columns: MAP FROM NAME TO (CUBE) VALUES
+    :return: GENERATOR OF utf8 BYTES FOR THE JSON OBJECT
+    """
+    sep = b"{"
+    for k, v in columns.items():
+        yield sep + unicode2utf8(value2json(k) + ":" + value2json(v))
+        sep = b","
+    yield b"}" if sep == b"," else b"{}"
+
+
 def replace_vars(text, params=None):
     """
     REPLACE {{vars}} WITH ENVIRONMENTAL VALUES
@@ -0,0 +1,155 @@
+# encoding: utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+from jx_elasticsearch.es52.cost import QUERY_TOO_EXPENSIVE
+from mo_kwargs import override
+from mo_logs import Log
+from mo_threads import Lock, Till
+
+QUERY_BUSY = "Too many expensive queries"
+POLL_PERIOD = 1  # SECONDS BETWEEN CHECKING IF A QUEUED QUERY MAY RUN
+
+control = None  # THE AdmissionControl, IF CONFIGURED
+
+
+class AdmissionControl(object):
+    """
+    PROTECT ES FROM EXPENSIVE QUERIES, USING THE CONTAINER'S estimate_cost()
+
+    QUERIES COSTING MORE THAN max_cost ARE REJECTED.  QUERIES COSTING MORE
+    THAN expensive_cost ARE QUEUED, SO EACH CLIENT HAS AT MOST
+    max_expensive_per_client OF THEM RUNNING AT ONCE.  CHEAP QUERIES ARE
+    NEVER HELD BACK
+
+    BEHIND A PROXY, EVERY REQUEST COMES FROM THE PROXY's ADDRESS, SO SET
+    client_header TO THE HEADER THE PROXY PUTS THE CLIENT ADDRESS IN
+    """
+
+    @override
+    def __init__(self, max_cost=None, expensive_cost=10 * 1000 * 1000, max_expensive_per_client=1, max_wait=30, client_header=None, kwargs=None):
+        """
+        :param max_cost: QUERIES ESTIMATED TO VISIT MORE DOCUMENTS THAN THIS ARE REJECTED
+        :param expensive_cost: QUERIES ESTIMATED TO VISIT MORE DOCUMENTS THAN THIS ARE QUEUED
+        :param max_expensive_per_client: NUMBER OF EXPENSIVE QUERIES ONE CLIENT MAY RUN AT ONCE
+        :param max_wait: SECONDS AN EXPENSIVE QUERY WAITS IN THE QUEUE BEFORE IT IS REJECTED
+        :param client_header: OPTIONAL HEADER WITH THE CLIENT ADDRESS (eg "X-Real-IP" OR "X-Forwarded-For")
+        """
+        self.max_cost = max_cost
+        self.expensive_cost = expensive_cost
+        self.max_expensive_per_client = max_expensive_per_client
+        self.max_wait = max_wait
+        self.client_header = client_header
+        self.locker = Lock("admission control")
+        self.running = {}  # MAP FROM CLIENT TO NUMBER OF EXPENSIVE QUERIES RUNNING
+
+    def client(self, request):
+        """
+        :return: THE ADDRESS OF THE CLIENT THAT SENT request
+        """
+        if self.client_header:
+            forwarded = request.headers.get(self.client_header)
+            if forwarded:
+                # THE PROXY APPENDS THE ADDRESS IT SAW, THE EARLIER ONES CAN BE FORGED
+                return forwarded.split(",")[-1].strip()
+        return request.remote_addr
+
+    def estimate(self, query, container):
+        """
+        :return: Data(hits, buckets, scripts, cost) OF query, OR None IF NOT KNOWN
+        """
+        estimate_cost = getattr(container, "estimate_cost", None)
+        if estimate_cost is None:
+            return None
+        try:
+            return estimate_cost(query)
+        except Exception as e:
+            Log.warning("Can not estimate query cost", cause=e)
+            return None
+
+    def admit(self, client, query, container):
+        """
+        RETURN WHEN query MAY BE RUN, OR RAISE AN ERROR
+        :param client: IDENTITY OF THE CLIENT (eg REMOTE ADDRESS)
+        :return: Slot, TO BE RELEASED WHEN THE RESPONSE IS SENT (STREAMED RESULTS DO THEIR ES WORK WHILE SENDING)
+        """
+        estimate = self.estimate(query, container)
+        if estimate is None or estimate.cost <= self.expensive_cost:
+            return Slot(None, client, estimate)
+        if self.max_cost and estimate.cost > self.max_cost:
+            Log.error(
+                QUERY_TOO_EXPENSIVE + ": expecting to visit {{cost}} documents, limit is {{max_cost}}",
+                cost=estimate.cost,
+                max_cost=self.max_cost
+            )
+
+        till = Till(seconds=self.max_wait)
+        with self.locker:
+            while self.running.get(client, 0) >= self.max_expensive_per_client:
+                if till:
+                    Log.error(QUERY_BUSY + " from {{client}}, try again later", client=client)
+                # THE SIGNAL MAY GO TO ANOTHER CLIENT'S QUERY, SO DO NOT WAIT FOR IT TOO LONG
+                self.locker.wait(till=till | Till(seconds=POLL_PERIOD))
+            self.running[client] = self.running.get(client, 0) + 1
+        return Slot(self, client, estimate)
+
+    def _release(self, client):
+        with self.locker:
+            remaining = self.running[client] - 1
+            if remaining:
+                self.running[client] = remaining
+            else:
+                del self.running[client]
+
+
+class Slot(object):
+    """
+    AN ADMITTED QUERY, HOLDING ITS PLACE AMONG THE CLIENT'S EXPENSIVE QUERIES
+    UNTIL release().  ALSO A CONTEXT MANAGER, GIVING THE COST ESTIMATE
+    """
+    __slots__ = ["control", "client", "estimate"]
+
+    def __init__(self, control, client, estimate):
+        self.control = control  # None IF NOT AN EXPENSIVE QUERY
+        self.client = client
+        self.estimate = estimate
+
+    def release(self):
+        """
+        SAFE TO CALL MORE THAN ONCE
+        """
+        control, self.control = self.control, None
+        if control is not None:
+            control._release(self.client)
+
+    def __enter__(self):
+        return self.estimate
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+
+def get_client(request):
+    """
+    SAME AS AdmissionControl.client(), THE remote_addr IF NOT CONFIGURED
+    """
+    if control is None:
+        return request.remote_addr
+    return control.client(request)
+
+
+def admit(client, query, container):
+    """
+    SAME AS AdmissionControl.admit(), ADMITTING EVERYTHING IF NOT CONFIGURED
+    """
+    if control is None:
+        return Slot(None, client, None)
+    return control.admit(client, query, container)
@@ -0,0 +1,193 @@
+# encoding: utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+from collections import Mapping
+from decimal import Decimal
+from time import time
+
+from jx_elasticsearch.es52.util import BINARY_FORMATS
+from mo_dots import unwrap, set_default
+from mo_future import text_type, generator_types, number_types, integer_types
+from mo_json import value2json, json2value
+from mo_logs import Log, Except
+from mo_math import Math
+from mo_times import Date
+from pyLibrary import trace
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+BATCH_SIZE = 1000  # NUMBER OF ROWS PER msgpack OBJECT, OR PER arrow RECORD BATCH
+
+
+def confirm_serializer(content_type):
+    """
+    RAISE AN ERROR, BEFORE THE RESPONSE STARTS, IF content_type CAN NOT BE MADE
+    """
+    if content_type == BINARY_FORMATS["msgpack"] and msgpack is None:
+        Log.error("The msgpack format requires the msgpack package")
+    if content_type == BINARY_FORMATS["arrow"] and pyarrow is None:
+        Log.error("The arrow format requires the pyarrow package")
+
+
+def stream_msgpack(result, query_timer):
+    """
+    GENERATOR OF msgpack OBJECTS FOR A table RESULT, ONE AFTER THE OTHER:
+        {"header": [name, ...]}
+        {"data": [column, ...]}  ONE FOR EACH BATCH OF ROWS, EACH column IS A LIST OF VALUES
+        {"meta": meta}  LAST, SO IT CAN INCLUDE THE TOTAL TIME
+    A FAILURE PART WAY THROUGH IS SENT AS {"error": error}
+    """
+    start = time()
+    traced = trace.spent(result.get("meta"))
+    num_bytes = 0
+    packer = msgpack.Packer(default=_to_msgpack, use_bin_type=True)
+    try:
+        chunk = packer.pack({"header": result.get("header")})
+        num_bytes += len(chunk)
+        yield chunk
+        for batch in _batches(result.get("data")):
+            chunk = packer.pack({"data": _columns(batch)})
+            num_bytes += len(chunk)
+            yield chunk
+    except Exception as e:
+        e = Except.wrap(e)
+        Log.warning("Problem streaming msgpack response after {{num}} bytes", num=num_bytes, cause=e)
+        yield packer.pack({"error": e.__data__()})
+        return
+
+    meta = _meta(result, query_timer, start, traced)
+    Log.note("Response is {{num}} bytes in {{duration}} seconds", num=num_bytes, duration=meta["timing"]["total"])
+    yield packer.pack({"meta": meta})
+
+
+def stream_arrow(result, query_timer):
+    """
+    GENERATOR OF THE ARROW IPC STREAM FOR A table RESULT
+
+    ARROW NEEDS THE COLUMN TYPES BEFORE THE FIRST BATCH, SO ALL ROWS ARE READ
+    FIRST.  COLUMNS WITH MIXED OR NESTED VALUES ARE SENT AS JSON STRINGS, AND
+    MARKED WITH {"encoding": "json"} FIELD METADATA.  THE meta IS IN THE
+    SCHEMA METADATA
+    """
+    start = time()
+    traced = trace.spent(result.get("meta"))
+    header = result.get("header")
+    columns = [[] for _ in header]
+    for batch in _batches(result.get("data")):
+        for column, values in zip(columns, _columns(batch)):
+            column.extend(values)
+
+    fields, arrays = [], []
+    for name, values in zip(header, columns):
+        data_type, values, metadata = _arrow_type(values)
+        fields.append(pyarrow.field(text_type(name), data_type, metadata=metadata))
+        arrays.append(pyarrow.array(values, type=data_type))
+    meta = _meta(result, query_timer, start, traced)
+    schema = pyarrow.schema(fields, metadata={"meta": value2json(meta)})
+
+    sink = pyarrow.BufferOutputStream()
+    writer = pyarrow.RecordBatchStreamWriter(sink, schema)
+    num_rows = len(columns[0]) if columns else 0
+    for i in range(0, num_rows, BATCH_SIZE):
+        writer.write_batch(pyarrow.RecordBatch.from_arrays([a[i:i + BATCH_SIZE] for a in arrays], schema=schema))
+    writer.close()
+    output = sink.getvalue().to_pybytes()
+    Log.note("Response is {{num}} bytes in {{duration}} seconds", num=len(output), duration=meta["timing"]["total"])
+    yield output
+
+
+serializers = {
+    BINARY_FORMATS["msgpack"]: stream_msgpack,
+    BINARY_FORMATS["arrow"]: stream_arrow
+}
+
+
+def _batches(rows):
+    """
+    :return: GENERATOR OF LISTS OF AT MOST BATCH_SIZE ROWS
+    """
+    batch = []
+    for row in rows or []:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _columns(rows):
+    """
+    :return: THE rows AS A LIST OF COLUMNS
+    """
+    return [list(c) for c in zip(*rows)]
+
+
+def _meta(result, query_timer, start, traced):
+    """
+    :param traced: trace.spent() WHEN SERIALIZATION STARTED, THE STREAMED PAGES' STEPS ARE NOT serialization
+    """
+    end = time()
+    timing = {
+        "total": Math.round(end - query_timer.start, digits=4),
+        "serialization": Math.round(end - start, digits=4)
+    }
+    trace.add_after(result.get("meta"), "serialization", end - start - (trace.spent(result.get("meta")) - traced))
+    # THE meta HAS Data, Duration AND OTHER OBJECTS, SO MAKE IT PLAIN JSON FIRST
+    return unwrap(json2value(value2json(set_default({"timing": timing}, result.get("meta")))))
+
+
+def _to_msgpack(value):
+    """
+    msgpack default: TURN THE REMAINING PYTHON OBJECTS INTO PLAIN ONES
+    """
+    if isinstance(value, Mapping):
+        return dict(unwrap(value))
+    elif isinstance(value, Date):
+        return value.unix
+    elif isinstance(value, Decimal):
+        return float(value)
+    elif isinstance(value, (set, tuple) + generator_types):
+        return list(value)
+    value = unwrap(value)
+    if value is None:
+        return None  # A Null, eg IN AN error
+    if isinstance(value, list):
+        return value
+    Log.error("Do not know how to send {{type}} as msgpack", type=value.__class__.__name__)
+
+
+def _arrow_type(values):
+    """
+    :return: (arrow type, values, field metadata) FOR ONE COLUMN
+    """
+    types = set(type(v) for v in values if v is not None)
+    if not types:
+        return pyarrow.null(), values, None
+    elif types == {bool}:
+        return pyarrow.bool_(), values, None
+    elif all(issubclass(t, number_types) and t is not bool for t in types):
+        if all(issubclass(t, integer_types) for t in types):
+            return pyarrow.int64(), values, None
+        return pyarrow.float64(), [None if v is None else float(v) for v in values], None
+    elif all(issubclass(t, text_type) for t in types):
+        return pyarrow.string(), values, None
+    else:
+        return pyarrow.string(), [None if v is None else value2json(v) for v in values], {"encoding": "json"}
@@ -14,17 +14,18 @@ import flask
 from flask import Response
 
 from active_data import record_request
-from active_data.actions import save_query, send_error, test_mode_wait, QUERY_TOO_LARGE, find_container
+from active_data.actions import save_query, send_error, test_mode_wait, QUERY_TOO_LARGE, find_container, stream_response, query_cache, replay_response, admission, binary
 from jx_base.container import Container
+from jx_base.query import QueryOp
 from jx_python import jx
 from mo_files import File
-from mo_future import binary_type
-from mo_json import value2json, json2value
+from mo_json import json2value
 from mo_logs import Log, Except
 from mo_logs.strings import unicode2utf8, utf82unicode
 from mo_math import Math
 from mo_threads.profiles import CProfiler
 from mo_times.timer import Timer
+from pyLibrary import trace
 from pyLibrary.env.flask_wrappers import cors_wrapper
 
 BLANK = unicode2utf8(File("active_data/public/error.html").read())
@@ -34,8 +35,10 @@ QUERY_SIZE_LIMIT = 10*1024*1024
 @cors_wrapper
 def jx_query(path):
     with CProfiler():
+        slot = None  # THE admission SLOT, HELD UNTIL THE RESPONSE IS SENT
         try:
             with Timer("total duration") as query_timer:
+                trace.start()
                 preamble_timer = Timer("preamble")
                 with preamble_timer:
                     if flask.request.headers.get("content-length", "") in ["", "0"]:
@@ -53,17 +56,42 @@ def jx_query(path):
                     request_body = flask.request.get_data().strip()
                     text = utf82unicode(request_body)
                     data = json2value(text)
-                    record_request(flask.request, data, None, None)
+                    record_request(flask.request, text, None, None)
                     if data.meta.testing:
                         test_mode_wait(data)
 
                 translate_timer = Timer("translate")
                 with translate_timer:
                     frum = find_container(data['from'])
+                    cache_key = None
+                    if query_cache.cache and not (data.meta.save or data.meta.testing or data.meta.stream or data.meta.profile):
+                        data = QueryOp.wrap(data, frum, frum.namespace)
+                        cache_key = query_cache.cache.get_key(data, frum)
+                        if cache_key[0]:
+                            entry = query_cache.cache.get(*cache_key)
+                            if entry:
+                                timing = {
+                                    "preamble": Math.round(preamble_timer.duration.seconds, digits=4),
+                                    "translate": Math.round(translate_timer.duration.seconds, digits=4)
+                                }
+                                return Response(
+                                    replay_response(entry, query_timer, timing),
+                                    status=200,
+                                    headers={
+                                        "Content-Type": entry.meta['content_type']
+                                    }
+                                )
+                        else:
+                            cache_key = None
+                    slot = admission.admit(admission.get_client(flask.request), data, frum)
+                    estimate = slot.estimate
                     result = jx.run(data, container=frum)
 
                     if isinstance(result, Container):  #TODO: REMOVE THIS CHECK, jx SHOULD ALWAYS RETURN Containers
                         result = result.format(data.format)
+                    binary.confirm_serializer(result.meta.content_type)
+                    if estimate:
+                        result.meta.cost = estimate
 
                 save_timer = Timer("save")
                 with save_timer:
@@ -76,30 +104,23 @@ def jx_query(path):
                 result.meta.timing.preamble = Math.round(preamble_timer.duration.seconds, digits=4)
                 result.meta.timing.translate = Math.round(translate_timer.duration.seconds, digits=4)
                 result.meta.timing.save = Math.round(save_timer.duration.seconds, digits=4)
-                result.meta.timing.total = "{{TOTAL_TIME}}"  # TIMING PLACEHOLDER
+                result.meta.timing.trace = trace.stop()
 
-                with Timer("jsonification") as json_timer:
-                    response_data = unicode2utf8(value2json(result))
-
-            with Timer("post timer"):
-                # IMPORTANT: WE WANT TO TIME OF THE JSON SERIALIZATION, AND HAVE IT IN THE JSON ITSELF.
-                # WE CHEAT BY DOING A (HOPEFULLY FAST) STRING REPLACEMENT AT THE VERY END
-                timing_replacement = (
-                    b'"total":' + binary_type(Math.round(query_timer.duration.seconds, digits=4)) +
-                    b', "jsonification":' + binary_type(Math.round(json_timer.duration.seconds, digits=4))
-                )
-                response_data = response_data.replace(b'"total":"{{TOTAL_TIME}}"', timing_replacement)
-                Log.note("Response is {{num}} bytes in {{duration}}", num=len(response_data), duration=query_timer.duration)
-
-                return Response(
-                    response_data,
+                # total AND jsonification TIMING ARE SENT IN THE TRAILING meta
+                response = Response(
+                    stream_response(result, query_timer, cache_key),
                     status=200,
                     headers={
                         "Content-Type": result.meta.content_type
                     }
                 )
+                # STREAMED RESULTS DO THEIR ES WORK WHILE THE RESPONSE IS SENT
+                response.call_on_close(slot.release)
+                slot = None
+                return response
         except Exception as e:
             e = Except.wrap(e)
+            if slot:
+                slot.release()
             return send_error(query_timer, request_body, e)
 
-
@@ -0,0 +1,224 @@
+# encoding: utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+import hashlib
+from collections import OrderedDict
+from time import time
+
+from mo_dots import Data, coalesce
+from mo_future import text_type
+from mo_json import value2json, json2value
+from mo_kwargs import override
+from mo_logs import Log
+from mo_logs.strings import unicode2utf8
+from mo_threads import Lock
+from pyLibrary.convert import bytes2base64, base642bytes
+from pyLibrary.sql import sql_list
+from pyLibrary.sql.sqlite import Sqlite, quote_value
+
+DEBUG = False
+CLEANUP_PERIOD = 1000  # NUMBER OF set() BETWEEN REMOVING EXPIRED RECORDS FROM THE SHARED DATABASE
+
+cache = None  # THE QueryCache, IF CONFIGURED
+
+
+class QueryCache(object):
+    """
+    LRU CACHE OF SERIALIZED /query RESPONSES, KEYED ON THE NORMALIZED QUERY
+
+    AN ENTRY IS VALID UNTIL ttl EXPIRES, OR THE METADATA OF ANY INDEX BEHIND
+    THE QUERIED ALIAS CHANGES (Cluster.index_last_updated). WITH sql_file,
+    ENTRIES ARE ALSO SHARED WITH OTHER PROCESSES USING THE SAME FILE
+    """
+
+    @override
+    def __init__(self, max_bytes=100 * 1024 * 1024, max_entry_bytes=10 * 1024 * 1024, ttl=60, sql_file=None, kwargs=None):
+        """
+        :param max_bytes: TOTAL SIZE OF THE IN-PROCESS CACHE
+        :param max_entry_bytes: RESPONSES BIGGER THAN THIS ARE NOT CACHED
+        :param ttl: NUMBER OF SECONDS AN ENTRY IS VALID
+        :param sql_file: OPTIONAL SQLITE FILE TO SHARE ENTRIES BETWEEN PROCESSES
+        """
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.ttl = ttl
+        self.locker = Lock("query cache")
+        self.entries = OrderedDict()  # MAP FROM KEY TO Data(version, expires, meta, body), LEAST RECENTLY USED FIRST
+        self.num_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.num_sets = 0
+
+        if sql_file:
+            self.db = Sqlite(filename=sql_file)
+            self.db.query(
+                "CREATE TABLE IF NOT EXISTS query_cache (" +
+                "key TEXT PRIMARY KEY, version REAL, expires REAL, meta TEXT, body TEXT" +
+                ")"
+            )
+        else:
+            self.db = None
+
+    def get_key(self, query, container):
+        """
+        :param query: NORMALIZED QueryOp
+        :param container: THE CONTAINER query WILL BE RUN AGAINST
+        :return: (key, version) PAIR, OR (None, None) IF THE QUERY CAN NOT BE CACHED
+        """
+        try:
+            version = _get_version(container)
+            if version == None:
+                return None, None
+            canonical = value2json({
+                "from": query.frum.name,
+                "select": query.select,
+                "edges": query.edges,
+                "groupby": query.groupby,
+                "where": query.where,
+                "window": query.window,
+                "sort": query.sort,
+                "limit": query.limit,
+                "format": query.format,
+                "isLean": query.isLean
+            })
+            key = text_type(hashlib.sha1(unicode2utf8(canonical)).hexdigest())
+            return key, version
+        except Exception as e:
+            Log.warning("Can not make cache key", cause=e)
+            return None, None
+
+    def get(self, key, version):
+        """
+        :return: Data(meta, body) OF THE CACHED RESPONSE, OR None
+        """
+        now = time()
+        with self.locker:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                if entry.version == version and now < entry.expires:
+                    self.entries[key] = entry  # MOST RECENTLY USED
+                    self.hits += 1
+                    return entry
+                self.num_bytes -= len(entry.body)
+
+        entry = self._db_get(key, version, now)
+        with self.locker:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._add(key, entry)
+        return entry
+
+    def set(self, key, version, meta, body):
+        """
+        :param meta: THE RESPONSE meta (WITHOUT TIMING)
+        :param body: THE RESPONSE BYTES, WITHOUT THE TRAILING meta
+        """
+        if len(body) > self.max_entry_bytes:
+            return
+        entry = Data(version=version, expires=time() + self.ttl, meta=meta, body=body)
+        with self.locker:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.num_bytes -= len(old.body)
+            self._add(key, entry)
+            self.num_sets += 1
+            cleanup = self.num_sets % CLEANUP_PERIOD == 0
+        self._db_set(key, entry, cleanup)
+
+    def stats(self, entry=None):
+        """
+        :param entry: THE CACHE ENTRY USED BY THIS REQUEST, IF ANY
+        :return: STATS TO BE SHOWN IN meta.timing
+        """
+        with self.locker:
+            return Data(
+                hit=entry is not None,
+                hits=self.hits,
+                misses=self.misses,
+                bytes=len(entry.body) if entry is not None else None,
+                total_bytes=self.num_bytes
+            )
+
+    def _add(self, key, entry):
+        """
+        EXPECTING LOCK TO BE HELD
+        """
+        self.entries[key] = entry
+        self.num_bytes += len(entry.body)
+        while self.num_bytes > self.max_bytes and self.entries:
+            _, oldest = self.entries.popitem(last=False)
+            self.num_bytes -= len(oldest.body)
+
+    def _db_get(self, key, version, now):
+        if not self.db:
+            return None
+        try:
+            result = self.db.query(
+                "SELECT version, expires, meta, body FROM query_cache WHERE key=" + quote_value(key)
+            )
+            if not result.data:
+                return None
+            db_version, expires, meta, body = result.data[0]
+            if db_version != version or expires <= now:
+                return None
+            return Data(
+                version=version,
+                expires=expires,
+                meta=json2value(base642bytes(meta).decode("utf8")),
+                body=base642bytes(body)
+            )
+        except Exception as e:
+            Log.warning("Problem reading shared query cache", cause=e)
+            return None
+
+    def _db_set(self, key, entry, cleanup):
+        if not self.db:
+            return
+        try:
+            self.db.query(
+                "INSERT OR REPLACE INTO query_cache (key, version, expires, meta, body) VALUES (" +
+                sql_list([
+                    quote_value(key),
+                    quote_value(entry.version),
+                    quote_value(entry.expires),
+                    # BASE64, SO THE SQL TEMPLATE EXPANSION CAN NOT TOUCH THE JSON
+                    quote_value(bytes2base64(unicode2utf8(value2json(entry.meta)))),
+                    quote_value(bytes2base64(entry.body))
+                ]) +
+                ")"
+            )
+            if cleanup:
+                self.db.query("DELETE FROM query_cache WHERE expires<" + quote_value(time()))
+        except Exception as e:
+            Log.warning("Problem writing shared query cache", cause=e)
+
+
+def _get_version(container):
+    """
+    :return: THE LATEST METADATA CHANGE TIME OF ALL THE INDEXES BEHIND THE CONTAINER, OR None IF NOT AN ES CONTAINER
+    """
+    es = getattr(container, "es", None)
+    if es is None:
+        return None
+    cluster = es.cluster
+    alias = coalesce(es.settings.alias, es.settings.index)
+    indices = cluster.get_metadata().indices
+    last_updated = [
+        cluster.index_last_updated.get(name)
+        for name, about in indices.items()
+        if name == alias or alias in about.aliases
+    ]
+    if not last_updated:
+        return None
+    return max(coalesce(d.unix, 0) if d else 0 for d in last_updated)
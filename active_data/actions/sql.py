@@ -17,18 +17,19 @@ from active_data import record_request
 from flask import Response
 from jx_python import jx
 from mo_dots import wrap, listwrap, unwraplist
-from mo_json import utf82unicode, json2value, value2json
+from mo_json import utf82unicode, json2value
 from mo_logs import Log
 from mo_logs.strings import unicode2utf8
 from mo_math import Math
 
 import moz_sql_parser
-from active_data.actions import save_query, send_error, test_mode_wait, find_container
+from active_data.actions import save_query, send_error, test_mode_wait, find_container, stream_response, admission, binary
 from active_data.actions.jx import BLANK, QUERY_SIZE_LIMIT
 from jx_base.container import Container
 from mo_logs.exceptions import Except
 from mo_testing.fuzzytestcase import assertAlmostEqual
 from mo_times.timer import Timer
+from pyLibrary import trace
 from pyLibrary.env.flask_wrappers import cors_wrapper
 
 
@@ -36,8 +37,10 @@ from pyLibrary.env.flask_wrappers import cors_wrapper
 def sql_query(path):
     query_timer = Timer("total duration")
     request_body = None
+    slot = None  # THE admission SLOT, HELD UNTIL THE RESPONSE IS SENT
     try:
         with query_timer:
+            trace.start()
             preamble_timer = Timer("preamble")
             with preamble_timer:
                 if flask.request.headers.get("content-length", "") in ["", "0"]:
@@ -55,7 +58,7 @@ def sql_query(path):
                 request_body = flask.request.get_data().strip()
                 text = utf82unicode(request_body)
                 data = json2value(text)
-                record_request(flask.request, data, None, None)
+                record_request(flask.request, text, None, None)
                 if data.meta.testing:
                     test_mode_wait(data)
 
@@ -64,10 +67,17 @@ def sql_query(path):
                 if not data.sql:
                     Log.error("Expecting a `sql` parameter")
                 jx_query = parse_sql(data.sql)
+                if data.meta.profile:
+                    jx_query.meta.profile = True
                 frum = find_container(jx_query['from'])
+                slot = admission.admit(admission.get_client(flask.request), jx_query, frum)
+                estimate = slot.estimate
                 result = jx.run(jx_query, container=frum)
                 if isinstance(result, Container):  # TODO: REMOVE THIS CHECK, jx SHOULD ALWAYS RETURN Containers
                     result = result.format(jx_query.format)
+                binary.confirm_serializer(result.meta.content_type)
+                if estimate:
+                    result.meta.cost = estimate
                 result.meta.jx_query = jx_query
 
             save_timer = Timer("save")
@@ -81,28 +91,24 @@ def sql_query(path):
             result.meta.timing.preamble = Math.round(preamble_timer.duration.seconds, digits=4)
             result.meta.timing.translate = Math.round(translate_timer.duration.seconds, digits=4)
             result.meta.timing.save = Math.round(save_timer.duration.seconds, digits=4)
-            result.meta.timing.total = "{{TOTAL_TIME}}"  # TIMING PLACEHOLDER
+            result.meta.timing.trace = trace.stop()
 
-            with Timer("jsonification") as json_timer:
-                response_data = unicode2utf8(value2json(result))
-
-        with Timer("post timer"):
-            # IMPORTANT: WE WANT TO TIME OF THE JSON SERIALIZATION, AND HAVE IT IN THE JSON ITSELF.
-            # WE CHEAT BY DOING A (HOPEFULLY FAST) STRING REPLACEMENT AT THE VERY END
-            timing_replacement = b'"total": ' + str(Math.round(query_timer.duration.seconds, digits=4)) +\
-                                 b', "jsonification": ' + str(Math.round(json_timer.duration.seconds, digits=4))
-            response_data = response_data.replace(b'"total":"{{TOTAL_TIME}}"', timing_replacement)
-            Log.note("Response is {{num}} bytes in {{duration}}", num=len(response_data), duration=query_timer.duration)
-
-            return Response(
-                response_data,
+            # total AND jsonification TIMING ARE SENT IN THE TRAILING meta
+            response = Response(
+                stream_response(result, query_timer),
                 status=200,
                 headers={
                     "Content-Type": result.meta.content_type
                 }
             )
+            # STREAMED RESULTS DO THEIR ES WORK WHILE THE RESPONSE IS SENT
+            response.call_on_close(slot.release)
+            slot = None
+            return response
     except Exception as e:
         e = Except.wrap(e)
+        if slot:
+            slot.release()
         return send_error(query_timer, request_body, e)
 
 
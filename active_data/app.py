@@ -23,16 +23,20 @@ from werkzeug.wrappers import Response
 
 import active_data
 from active_data import record_request, OVERVIEW
-from active_data.actions import save_query
+from active_data.actions import save_query, query_cache, admission
+from active_data.actions.admission import AdmissionControl
 from active_data.actions.contribute import send_contribute
 from active_data.actions.json import get_raw_json
 from active_data.actions.jx import jx_query
+from active_data.actions.query_cache import QueryCache
 from active_data.actions.save_query import SaveQueries, find_query
 from active_data.actions.sql import sql_query
 from active_data.actions.static import download
+from active_data.request_log import RequestLogQueue
 from jx_base import container
 from mo_files import File
-from mo_future import text_type
+import mo_future
+from mo_future import text_type, PY3
 from mo_logs import Log, constants, startup
 from mo_logs.strings import unicode2utf8
 from mo_threads import Thread
@@ -109,12 +113,13 @@ def setup():
 
     constants.set(config.constants)
     Log.start(config.debug)
+    _check_cooperative()
 
     cluster = elasticsearch.Cluster(config.request_logs)
     # PIPE REQUEST LOGS TO ES DEBUG
     if config.request_logs:
         request_logger = cluster.get_or_create_index(config.request_logs)
-        active_data.request_log_queue = request_logger.threaded_queue(max_size=2000)
+        active_data.request_log_queue = RequestLogQueue(index=request_logger, kwargs=config.request_log_queue)
 
     if config.dockerflow:
         def backend_check():
@@ -132,6 +137,12 @@ def setup():
     if config.saved_queries:
         setattr(save_query, "query_finder", SaveQueries(config.saved_queries))
 
+    if config.query_cache:
+        setattr(query_cache, "cache", QueryCache(config.query_cache))
+
+    if config.admission:
+        setattr(admission, "control", AdmissionControl(config.admission))
+
     HeaderRewriterFix(flask_app, remove_headers=['Date', 'Server'])
 
 
@@ -198,6 +209,24 @@ def setup_flask_ssl():
     config.flask.ssl_context = None
 
 
+def _check_cooperative():
+    """
+    UNDER A gevent WORKER, mo_threads MUST HAVE THE PATCHED (COOPERATIVE) thread
+    PRIMITIVES, OTHERWISE THE FIRST REQUEST TO WAIT ON A Lock BLOCKS THEM ALL
+    """
+    try:
+        from gevent import monkey
+    except ImportError:
+        return
+
+    thread_module = "_thread" if PY3 else "thread"
+    if not monkey.is_module_patched(thread_module):
+        return
+    if mo_future.allocate_lock is monkey.get_original(thread_module, "allocate_lock"):
+        Log.error("mo_threads was imported before gevent patched the thread module; do not use preload_app")
+    Log.note("Serving requests with gevent")
+
+
 def _exit():
     Log.note("Got request to shutdown")
     try:
@@ -0,0 +1,43 @@
+# encoding: utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+import os
+
+from jx_elasticsearch import meta
+from jx_elasticsearch.meta import ElasticsearchMetadata
+from mo_logs import Log, constants, startup
+from mo_threads import MAIN_THREAD
+
+
+def main():
+    """
+    THE ONE PROCESS THAT PROBES ES FOR METADATA, AND SHARES IT, THROUGH THE
+    sql_file, WITH THE ActiveData WORKERS (WHICH SET
+    jx_elasticsearch.meta.SHARE_METADATA TO "follow")
+
+    MUST USE THE SAME CONFIG AS THE WORKERS, AND RUN IN THE SAME DIRECTORY
+    """
+    try:
+        config = startup.read_settings(filename=os.environ.get('ACTIVEDATA_CONFIG'))
+        constants.set(config.constants)
+        Log.start(config.debug)
+        meta.SHARE_METADATA = meta.PUBLISH
+        ElasticsearchMetadata(kwargs=config.elasticsearch)
+        MAIN_THREAD.wait_for_shutdown_signal(allow_exit=True)
+    except Exception as e:
+        Log.error("Problem with metadata service", cause=e)
+    finally:
+        Log.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+# encoding: utf-8
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+from collections import deque
+
+from mo_collections.persistent_queue import PersistentQueue
+from mo_kwargs import override
+from mo_logs import Log, Except
+from mo_threads import Lock, Thread, Till
+from pyLibrary.env.elasticsearch import HOPELESS
+
+DEBUG = False
+
+
+class RequestLogQueue(object):
+    """
+    SEND REQUEST LOGS TO ES WITHOUT SLOWING THE REQUESTS
+
+    add() ONLY APPENDS TO A RING BUFFER; WHEN IT IS FULL THE OLDEST LOG IS
+    DROPPED AND COUNTED.  A BACKGROUND THREAD SENDS THE LOGS TO ES IN _bulk
+    BATCHES.  WHEN ES FALLS BEHIND (A SEND FAILS, OR THE BUFFER IS HALF FULL)
+    THE WAITING LOGS ARE SPILLED TO spill_file, AND SENT (OLDEST FIRST) WHEN
+    ES CATCHES UP
+    """
+
+    @override
+    def __init__(self, index, max_size=2000, batch_size=100, period=1, spill_file=None, kwargs=None):
+        """
+        :param index: THE ES Index TO SEND THE LOGS TO
+        :param max_size: NUMBER OF LOGS HELD IN MEMORY, MORE ARE DROPPED
+        :param batch_size: NUMBER OF LOGS SENT IN ONE _bulk REQUEST
+        :param period: SECONDS BETWEEN LOOKING FOR NEW LOGS
+        :param spill_file: OPTIONAL FILE FOR LOGS WAITING ON A SLOW ES, WHICH ARE DROPPED OTHERWISE
+        """
+        self.index = index
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.period = period
+        self.locker = Lock("request log queue")
+        self.buffer = deque()  # LOGS WAITING TO BE SENT, OLDEST FIRST
+        self.spill = PersistentQueue(spill_file) if spill_file else None
+        self.dropped = 0
+        self.spilled = 0
+        self.sent = 0
+        self.reported_dropped = 0
+        self.sender = Thread.run("send request logs", self._send_loop)
+
+    def add(self, log):
+        """
+        NEVER BLOCKS
+        :param log: THE REQUEST LOG, NOT SHARED WITH ANY OTHER THREAD
+        """
+        with self.locker:
+            if len(self.buffer) >= self.max_size:
+                self.buffer.popleft()
+                self.dropped += 1
+            self.buffer.append(log)
+
+    def stats(self):
+        with self.locker:
+            return {
+                "buffered": len(self.buffer),
+                "spilled": self.spilled,
+                "dropped": self.dropped,
+                "sent": self.sent
+            }
+
+    def _send_loop(self, please_stop):
+        while not please_stop:
+            self._report_dropped()
+            try:
+                if self._too_many_waiting():
+                    self._spill_waiting()
+                if not self._send_one_batch():
+                    (please_stop | Till(seconds=self.period)).wait()
+            except Exception as e:
+                Log.warning("Problem sending request logs, will try again", cause=e)
+                self._spill_waiting()
+                (please_stop | Till(seconds=self.period)).wait()
+
+        # ONE LAST ATTEMPT, WHAT REMAINS IS LOST, OR KEPT IN THE spill_file
+        try:
+            while self._send_one_batch():
+                pass
+        except Exception as e:
+            Log.warning("Request logs not sent before shutdown", cause=e)
+        self._report_dropped()
+        if self.spill is not None:
+            self._spill_waiting()
+            self.spill.close()
+
+    def _too_many_waiting(self):
+        with self.locker:
+            return len(self.buffer) >= self.max_size // 2
+
+    def _spill_waiting(self):
+        """
+        MOVE THE WAITING LOGS TO THE spill_file, IF THERE IS ONE
+        SPILLED LOGS ARE ALWAYS OLDER THAN THE buffer ONES, SO ORDER IS KEPT
+        """
+        if self.spill is None:
+            return
+        with self.locker:
+            logs = list(self.buffer)
+            self.buffer.clear()
+            self.spilled += len(logs)
+        try:
+            for log in logs:
+                self.spill.add(log)
+        except Exception as e:
+            Log.warning("Can not spill request logs", cause=e)
+
+    def _report_dropped(self):
+        with self.locker:
+            dropped = self.dropped - self.reported_dropped
+            self.reported_dropped = self.dropped
+        if dropped:
+            Log.warning("Dropped {{num}} request logs", num=dropped)
+
+    def _send_one_batch(self):
+        """
+        :return: True IF A BATCH WAS SENT
+        """
+        if self.spill is not None and len(self.spill):
+            batch = [self.spill.pop() for _ in range(min(self.batch_size, len(self.spill)))]
+            try:
+                self._extend(batch)
+            except Exception:
+                self.spill.rollback()
+                raise
+            self.spill.commit()
+            return True
+
+        with self.locker:
+            batch = [self.buffer.popleft() for _ in range(min(self.batch_size, len(self.buffer)))]
+        if not batch:
+            return False
+        try:
+            self._extend(batch)
+        except Exception:
+            with self.locker:
+                self.buffer.extendleft(reversed(batch))
+            raise
+        return True
+
+    def _extend(self, batch):
+        """
+        SEND batch IN ONE _bulk REQUEST, RAISE AN ERROR IF IT SHOULD BE TRIED AGAIN
+        """
+        try:
+            self.index.extend([{"value": log} for log in batch])
+        except Exception as e:
+            e = Except.wrap(e)
+            if any(h in e for h in HOPELESS):
+                Log.warning("ES will not accept {{num}} request logs, not trying again", num=len(batch), cause=e)
+                with self.locker:
+                    self.dropped += len(batch)
+                return
+            raise
+        with self.locker:
+            self.sent += len(batch)
+        DEBUG and Log.note("sent {{num}} request logs", num=len(batch))
+
+    def stop(self):
+        self.sender.stop()
+        self.sender.join()
@@ -0,0 +1,20 @@
+# SAME AS gunicorn.py, BUT EACH WORKER SERVES MANY REQUESTS AT ONCE WITH gevent
+#
+# A REQUEST WAITING ON ES GIVES UP ITS WORKER TO THE OTHERS, SO A FEW SLOW
+# AGGREGATIONS NO LONGER STARVE EVERYONE ELSE.  gunicorn PATCHES socket, thread
+# AND time BEFORE THE APP IS IMPORTED, WHICH MAKES THE mo_threads PRIMITIVES
+# (Lock, Signal, Till, Thread) COOPERATIVE.  DO NOT USE preload_app, IT WOULD
+# IMPORT THE APP BEFORE THE PATCH.
+#
+# REQUIRES `pip install gevent`
+#
+# THE CONCURRENT CALLS TO ES FROM EACH WORKER ARE STILL LIMITED BY THE
+# "pool_size" OF THE "elasticsearch" SETTINGS (DEFAULT 10); RAISE IT TO LET
+# MORE QUERIES BE IN FLIGHT AT ONCE
+
+import os
+
+exec(open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "gunicorn.py")).read())
+
+worker_class = "gevent"
+worker_connections = 200  # REQUESTS IN FLIGHT PER WORKER
@@ -0,0 +1,145 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+from active_data.actions.admission import AdmissionControl, QUERY_BUSY
+from jx_base.expressions import jx_expression, TRUE
+from jx_elasticsearch.es52.cost import estimate_cost, QUERY_TOO_EXPENSIVE, SCRIPT_COST, DEFAULT_CARDINALITY
+from mo_dots import Data, wrap
+from mo_logs import Except
+from mo_testing.fuzzytestcase import FuzzyTestCase
+
+
+class TestAdmission(FuzzyTestCase):
+
+    def test_cost_of_everything(self):
+        query = wrap({"where": TRUE, "groupby": [{"value": jx_expression("a")}]})
+        result = estimate_cost(frum, query)
+        self.assertEqual(result, {"hits": 100000, "buckets": 11, "scripts": 0, "cost": 100000})
+
+    def test_cost_of_eq(self):
+        query = wrap({"where": jx_expression({"eq": {"b": "x"}}), "groupby": [{"value": jx_expression("a")}]})
+        result = estimate_cost(frum, query)
+        self.assertEqual(result, {"hits": 1000, "buckets": 11, "scripts": 0, "cost": 1000})
+
+    def test_cost_of_nested_buckets(self):
+        query = wrap({"where": TRUE, "edges": [{"value": jx_expression("a")}, {"value": jx_expression("b")}]})
+        result = estimate_cost(frum, query)
+        self.assertEqual(result.buckets, 11 * 101)
+
+    def test_buckets_limited_by_hits(self):
+        query = wrap({"where": jx_expression({"eq": {"b": "x"}}), "groupby": [{"value": jx_expression("a")}, {"value": jx_expression("c")}]})
+        result = estimate_cost(frum, query)
+        self.assertEqual(result.buckets, 1000, "can not have more buckets than documents")
+
+    def test_unknown_cardinality(self):
+        query = wrap({"where": TRUE, "groupby": [{"value": jx_expression("d")}]})
+        result = estimate_cost(frum, query)
+        self.assertEqual(result.buckets, DEFAULT_CARDINALITY + 1)
+
+    def test_script_costs_more(self):
+        query = wrap({"where": TRUE, "groupby": [{"value": jx_expression({"add": ["a", "b"]})}]})
+        result = estimate_cost(frum, query)
+        self.assertEqual(result.scripts, 1)
+        self.assertEqual(result.cost, 100000 * (1 + SCRIPT_COST))
+
+    def test_cheap_query_admitted(self):
+        control = AdmissionControl(expensive_cost=100, max_wait=0)
+        with control.admit("a", None, Container(10)) as estimate:
+            with control.admit("a", None, Container(10)):
+                self.assertEqual(estimate.cost, 10)
+        self.assertEqual(control.running, {})
+
+    def test_unknown_cost_admitted(self):
+        control = AdmissionControl(expensive_cost=100, max_wait=0)
+        with control.admit("a", None, object()) as estimate:
+            self.assertEqual(estimate, None)
+
+    def test_too_expensive_rejected(self):
+        control = AdmissionControl(max_cost=1000, expensive_cost=100, max_wait=0)
+
+        def run():
+            with control.admit("a", None, Container(1001)):
+                pass
+
+        self.assertRaises(QUERY_TOO_EXPENSIVE, run)
+        self.assertEqual(control.running, {})
+
+    def test_expensive_query_waits_for_same_client(self):
+        control = AdmissionControl(expensive_cost=100, max_wait=0.1)
+        with control.admit("a", None, Container(101)):
+            self.assertEqual(control.running, {"a": 1})
+            try:
+                with control.admit("a", None, Container(101)):
+                    pass
+                self.fail("expecting the second expensive query to be rejected")
+            except Exception as e:
+                self.assertIn(QUERY_BUSY, Except.wrap(e))
+            with control.admit("b", None, Container(101)):
+                self.assertEqual(control.running, {"a": 1, "b": 1})
+        self.assertEqual(control.running, {})
+
+    def test_slot_held_until_released(self):
+        control = AdmissionControl(expensive_cost=100, max_wait=0)
+        slot = control.admit("a", None, Container(101))
+        self.assertEqual(slot.estimate.cost, 101)
+        self.assertEqual(control.running, {"a": 1}, "still running, while the response streams")
+        self.assertRaises(QUERY_BUSY, control.admit, "a", None, Container(101))
+        slot.release()
+        slot.release()
+        self.assertEqual(control.running, {}, "released once")
+        control.admit("a", None, Container(101)).release()
+
+    def test_cheap_slot_not_counted(self):
+        control = AdmissionControl(expensive_cost=100, max_wait=0)
+        slot = control.admit("a", None, Container(10))
+        self.assertEqual(control.running, {})
+        slot.release()
+        self.assertEqual(control.running, {})
+
+    def test_client_from_header(self):
+        control = AdmissionControl(client_header="X-Forwarded-For")
+        request = Data(remote_addr="10.0.0.1", headers={"X-Forwarded-For": "1.2.3.4, 5.6.7.8"})
+        self.assertEqual(control.client(request), "5.6.7.8")
+
+    def test_client_without_header(self):
+        control = AdmissionControl(client_header="X-Real-IP")
+        request = Data(remote_addr="10.0.0.1", headers={})
+        self.assertEqual(control.client(request), "10.0.0.1")
+
+
+class Container(object):
+    def __init__(self, cost):
+        self.cost = cost
+
+    def estimate_cost(self, query):
+        return Data(cost=self.cost)
+
+
+class S(object):
+    def __init__(self, columns):
+        self.columns = wrap(columns)
+
+    def values(self, name):
+        return self.leaves(name)
+
+    def leaves(self, name):
+        return wrap([c for c in self.columns if c.name == name])
+
+
+frum = Data(schema=S([
+    {"name": "a", "es_column": "a", "jx_type": "string", "es_type": "keyword", "count": 100000, "cardinality": 10},
+    {"name": "b", "es_column": "b", "jx_type": "string", "es_type": "keyword", "count": 100000, "cardinality": 100},
+    {"name": "c", "es_column": "c", "jx_type": "number", "es_type": "long", "count": 500, "cardinality": 500},
+    {"name": "d", "es_column": "d", "jx_type": "number", "es_type": "long", "count": 0, "cardinality": None}
+]))
@@ -0,0 +1,122 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+from unittest import skipIf
+
+from active_data.actions import binary
+from jx_elasticsearch.es52.util import BINARY_FORMATS
+from mo_dots import Data
+from mo_json import json2value
+from mo_logs import Log
+from mo_testing.fuzzytestcase import FuzzyTestCase
+from mo_times import Timer, Date
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+class TestBinaryFormats(FuzzyTestCase):
+
+    def setUp(self):
+        self.batch_size = binary.BATCH_SIZE
+        binary.BATCH_SIZE = 2
+
+    def tearDown(self):
+        binary.BATCH_SIZE = self.batch_size
+
+    @skipIf(msgpack is None, "requires msgpack")
+    def test_msgpack_round_trip(self):
+        result = _table(BINARY_FORMATS["msgpack"])
+        objects = _unpack(binary.stream_msgpack(result, _timer()))
+
+        self.assertEqual(len(objects), 4, "expecting header, two batches, and meta")
+        self.assertEqual(objects[0], {"header": ["a", "b", "c"]})
+        self.assertEqual(objects[1], {"data": [[1, 2], ["x", None], [1.5, None]]})
+        self.assertEqual(objects[2], {"data": [[3], [{"d": 1}], [Date("2018-01-01").unix]]})
+        self.assertEqual(objects[3]["meta"]["format"], "table")
+        self.assertGreaterEqual(objects[3]["meta"]["timing"]["serialization"], 0)
+
+    @skipIf(msgpack is None, "requires msgpack")
+    def test_msgpack_error_after_first_batch(self):
+        def rows():
+            yield [1, "x", 1.5]
+            yield [2, None, None]
+            Log.error("problem reading rows")
+
+        result = Data(meta={"format": "table"}, header=["a", "b", "c"], data=rows())
+        objects = _unpack(binary.stream_msgpack(result, _timer()))
+
+        self.assertEqual(objects[1], {"data": [[1, 2], ["x", None], [1.5, None]]})
+        self.assertIn("problem reading rows", objects[-1]["error"]["template"])
+        self.assertEqual(len(objects), 3, "no meta after an error")
+
+    @skipIf(pyarrow is None, "requires pyarrow")
+    def test_arrow_round_trip(self):
+        result = _table(BINARY_FORMATS["arrow"])
+        output = b"".join(binary.stream_arrow(result, _timer()))
+        table = pyarrow.ipc.open_stream(pyarrow.py_buffer(output)).read_all()
+
+        self.assertEqual(table.column_names, ["a", "b", "c"])
+        self.assertEqual(table.num_rows, 3)
+        self.assertEqual(table.schema.field_by_name("a").type, pyarrow.int64())
+        self.assertEqual(table.schema.field_by_name("b").metadata, {b"encoding": b"json"})
+        columns = table.to_pydict()
+        self.assertEqual(columns["a"], [1, 2, 3])
+        self.assertEqual([None if v is None else json2value(v) for v in columns["b"]], ["x", None, {"d": 1}])
+
+        meta = json2value(table.schema.metadata[b"meta"].decode("utf8"))
+        self.assertEqual(meta.format, "table")
+        self.assertGreaterEqual(meta.timing.serialization, 0)
+
+    def test_confirm_serializer(self):
+        binary.confirm_serializer("application/json")
+        if msgpack is None:
+            self.assertRaises("requires the msgpack package", binary.confirm_serializer, BINARY_FORMATS["msgpack"])
+        else:
+            binary.confirm_serializer(BINARY_FORMATS["msgpack"])
+        if pyarrow is None:
+            self.assertRaises("requires the pyarrow package", binary.confirm_serializer, BINARY_FORMATS["arrow"])
+        else:
+            binary.confirm_serializer(BINARY_FORMATS["arrow"])
+
+
+def _table(content_type):
+    return Data(
+        meta={"format": "table", "content_type": content_type},
+        header=["a", "b", "c"],
+        data=[
+            [1, "x", 1.5],
+            [2, None, None],
+            [3, {"d": 1}, Date("2018-01-01")]
+        ]
+    )
+
+
+def _unpack(chunks):
+    unpacker = msgpack.Unpacker(raw=False)
+    unpacker.feed(b"".join(chunks))
+    return list(unpacker)
+
+
+def _timer():
+    with Timer("test") as timer:
+        pass
+    return timer
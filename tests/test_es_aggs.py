@@ -0,0 +1,197 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+from jx_base.query import _normalize_percentile_method
+from jx_elasticsearch.es52 import aggs
+from jx_elasticsearch.es52.aggs import _add_percentile, DEFAULT_HDR_DIGITS, flatten_aggs, drill
+from jx_elasticsearch.es52.format import format_table_from_composite
+from mo_dots import Data, wrap, Null
+from mo_testing.fuzzytestcase import FuzzyTestCase
+
+
+class TestESAggs(FuzzyTestCase):
+
+    def test_percentiles_share_one_agg(self):
+        es_query, percentiles = Data(), {}
+        source = {"field": "a"}
+        names = [
+            _add_percentile(es_query, percentiles, source, percent, _percentile())
+            for percent in [50, 90, 99]
+        ]
+        self.assertEqual(set(names), {"_percentiles0"})
+        self.assertEqual(es_query.aggs.keys(), {"_percentiles0"})
+        self.assertEqual(es_query.aggs._percentiles0.percentiles, {"field": "a", "percents": [50, 90, 99]})
+
+    def test_median_shares_with_stats(self):
+        es_query, percentiles = Data(), {}
+        source = {"field": "a"}
+        a = _add_percentile(es_query, percentiles, source, 50, _percentile(aggregate="median"))
+        b = _add_percentile(es_query, percentiles, source, 50, _percentile(aggregate="stats"))
+        c = _add_percentile(es_query, percentiles, source, 90, _percentile(aggregate="median", accuracy=2))
+        d = _add_percentile(es_query, percentiles, source, 90, _percentile())
+        self.assertEqual(a, b)
+        self.assertEqual(es_query.aggs[a].percentiles.percents, [50])
+        self.assertEqual(c, d, "same method and accuracy share one aggregate")
+        self.assertNotEqual(a, c)
+
+    def test_same_percent_not_repeated(self):
+        es_query, percentiles = Data(), {}
+        source = {"field": "a"}
+        _add_percentile(es_query, percentiles, source, 50, _percentile())
+        _add_percentile(es_query, percentiles, source, 50, _percentile())
+        self.assertEqual(es_query.aggs._percentiles0.percentiles.percents, [50])
+
+    def test_different_methods_do_not_share(self):
+        es_query, percentiles = Data(), {}
+        source = {"field": "a"}
+        a = _add_percentile(es_query, percentiles, source, 90, _percentile())
+        b = _add_percentile(es_query, percentiles, source, 90, _percentile(method="hdr"))
+        c = _add_percentile(es_query, percentiles, source, 90, _percentile(method="hdr", accuracy=2))
+        self.assertEqual(len({a, b, c}), 3)
+        self.assertEqual(es_query.aggs[b].percentiles.hdr.number_of_significant_value_digits, DEFAULT_HDR_DIGITS)
+        self.assertEqual(es_query.aggs[c].percentiles.hdr.number_of_significant_value_digits, 2)
+
+    def test_different_columns_do_not_share(self):
+        es_query, percentiles = Data(), {}
+        a = _add_percentile(es_query, percentiles, {"field": "a"}, 90, _percentile())
+        b = _add_percentile(es_query, percentiles, {"field": "b"}, 90, _percentile())
+        self.assertNotEqual(a, b)
+
+    def test_default_method(self):
+        select = Data(aggregate="percentile", percentile=0.9)
+        _normalize_percentile_method(select)
+        self.assertEqual(select.method, "tdigest")
+
+    def test_bad_method(self):
+        self.assertRaises("Expecting method to be one of", _normalize_percentile_method, Data(method="exact"))
+
+    def test_bad_accuracy(self):
+        self.assertRaises("Expecting accuracy to be a positive number", _normalize_percentile_method, Data(accuracy="high"))
+        self.assertRaises("Expecting accuracy to be a positive number", _normalize_percentile_method, Data(accuracy=0))
+
+    def test_bad_hdr_accuracy(self):
+        self.assertRaises("Expecting hdr accuracy", _normalize_percentile_method, Data(method="hdr", accuracy=7))
+        self.assertRaises("Expecting hdr accuracy", _normalize_percentile_method, Data(method="hdr", accuracy=2.5))
+
+    def test_good_hdr_accuracy(self):
+        select = Data(method="hdr", accuracy=5)
+        _normalize_percentile_method(select)
+        self.assertEqual(select.method, "hdr")
+
+    def test_composite_table_in_groupby_order(self):
+        # SORTED BY THE SECOND groupby, SO IT IS THE FIRST composite SOURCE
+        sources = wrap([
+            {"name": "_0", "edge": {"name": "b"}, "column": 1, "pull": lambda v: v},
+            {"name": "_1", "edge": {"name": "a"}, "column": 0, "pull": lambda v: v}
+        ])
+        pages = [[{"key": {"_0": "b1", "_1": "a1"}, "doc_count": 2}]]
+        select = wrap([{"name": "count", "pull": lambda agg: agg["doc_count"]}])
+        result = format_table_from_composite(sources, pages, Data(), select)
+        self.assertEqual(result.header, ["a", "b", "count"])
+        self.assertEqual(result.data, [["a1", "b1", 2]])
+
+    def test_flatten_matches_walk(self):
+        for depth in range(2):
+            tree = _bucket_tree()
+            expected = [_ids(parts, a) for a, parts in _walk(tree, depth)]
+            self.assertEqual([_ids(parts, a) for parts, a in flatten_aggs(tree, depth)], expected)
+            self.assertGreater(len(expected), 0)
+
+    def test_flatten_keeps_response_clean(self):
+        tree = _bucket_tree()
+        keys = set(tree.keys())
+        flatten_aggs(tree, 1)
+        self.assertEqual(set(tree.keys()), keys)
+        self.assertNotEqual(flatten_aggs(tree, 1), [])
+        self.assertIsNot(flatten_aggs(tree, 1), flatten_aggs(tree, 1), "not remembered outside es_aggsop()")
+
+    def test_flatten_remembered_while_formatting(self):
+        tree = _bucket_tree()
+        aggs._flattened[id(tree)] = {}
+        try:
+            self.assertIs(flatten_aggs(tree, 1), flatten_aggs(tree, 1))
+        finally:
+            aggs._flattened.pop(id(tree), None)
+
+
+def _bucket_tree():
+    """
+    TWO LEVELS OF EVERY KIND OF BUCKET
+    """
+    def leaves():
+        return {
+            "_match": {"_filter": {"buckets": [{"key": "x", "doc_count": 1}, {"key": "y", "doc_count": 2}]}},
+            "_other": {"buckets": [{"doc_count": 3}]},
+            "_missing": {"_filter": {"doc_count": 4}},
+            "_join_0": {"doc_count": 5}
+        }
+
+    return {
+        "doc_count": 15,
+        "_filter": {
+            "_match": {"buckets": [dict(leaves(), key="a", doc_count=3), dict(leaves(), key="b", doc_count=4)]},
+            "_other": {"buckets": [dict(leaves(), doc_count=1)]},
+            "_missing": {"_nested": dict(leaves(), doc_count=2)},
+            "_join_1": dict(leaves(), doc_count=5)
+        }
+    }
+
+
+def _walk(agg, d):
+    """
+    THE RECURSIVE GENERATOR aggs_iterator() USED BEFORE flatten_aggs()
+    """
+    agg = drill(agg)
+    for k, v in agg.items():
+        if k == "_match":
+            v = drill(v)
+            for i, b in enumerate(v.get("buckets", [])):
+                b["_index"] = i
+                if d > 0:
+                    for a, parts in _walk(b, d - 1):
+                        yield a, parts + (b,)
+                else:
+                    yield b, (b,)
+        elif k == "_other":
+            for b in v.get("buckets", []):
+                if d > 0:
+                    for a, parts in _walk(b, d - 1):
+                        yield a, parts + (Null,)
+                else:
+                    yield b, (Null,)
+        elif k == "_missing":
+            b = drill(v)
+            if d > 0:
+                for a, parts in _walk(b, d - 1):
+                    yield a, parts + (b,)
+            else:
+                yield b, (v,)
+        elif k.startswith("_join_"):
+            if d > 0:
+                v["key"] = int(k[6:])
+                for a, parts in _walk(v, d - 1):
+                    yield a, parts + (v,)
+            else:
+                v["_index"] = int(k[6:])
+                yield v, (v,)
+
+
+def _ids(parts, agg):
+    return tuple(id(p) for p in parts), id(agg)
+
+
+def _percentile(aggregate="percentile", **kwargs):
+    select = Data(aggregate=aggregate, **kwargs)
+    _normalize_percentile_method(select)
+    return select
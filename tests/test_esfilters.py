@@ -13,8 +13,9 @@ from __future__ import division
 from __future__ import unicode_literals
 
 from jx_base.expressions import jx_expression, NULL
+from jx_elasticsearch.es52 import _where_bounds, _intersects
 from jx_elasticsearch.es52.expressions import EsScript, simplify_esfilter
-from jx_elasticsearch.es52.util import es_and
+from jx_elasticsearch.es52.util import es_and, es_script, painless
 from mo_dots import Null, wrap
 from mo_json.typed_encoder import OBJECT
 from mo_testing.fuzzytestcase import FuzzyTestCase
@@ -82,6 +83,55 @@ class TestESFilters(FuzzyTestCase):
         # THIS TEST IS USED TO FORCE-IMPORT OF elasticsearch EXTENSION METHODS
         a = EsScript(type=OBJECT, expr=NULL, frum=NULL)
 
+    def test_script_literals_are_params(self):
+        result = es_script('doc["a"].value=="x" || doc["b"].value=="x"')
+        self.assertEqual(result, {"script": {
+            "lang": "painless",
+            "inline": 'doc[params.p0].value==params.p1 || doc[params.p2].value==params.p1',
+            "params": {"p0": "a", "p1": "x", "p2": "b"}
+        }})
+
+    def test_script_same_shape_same_source(self):
+        a = es_script('doc["a"].value=="x"')
+        b = es_script('doc["a"].value=="y \\"quoted\\""')
+        self.assertEqual(a.script.inline, b.script.inline)
+        self.assertEqual(b.script.params.p1, 'y "quoted"')
+
+    def test_script_params_not_shared(self):
+        a = painless('doc["a"].value=="x"')
+        a["params"]["p9"] = "changed"
+        b = painless('doc["a"].value=="x"')
+        self.assertEqual(b["params"], {"p0": "a", "p1": "x"})
+        self.assertNotIn("p9", b["params"])
+
+    def test_where_bounds(self):
+        where = jx_expression({"and": [
+            {"gte": {"a": 10}},
+            {"lt": {"b": 20}},
+            {"gt": [30, "c"]},
+            {"eq": {"d": 1}},
+            {"gt": {"e": "x"}}
+        ]})
+        result = _where_bounds(where)
+        self.assertEqual(result, [("a", "gte", 10), ("b", "lt", 20), ("c", "lt", 30)])
+
+    def test_where_bounds_of_range(self):
+        result = _where_bounds(jx_expression({"range": {"a": {"gte": 10, "lt": 20}}}))
+        self.assertEqual(set(result), {("a", "gte", 10), ("a", "lt", 20)})
+
+    def test_where_bounds_ignores_or(self):
+        result = _where_bounds(jx_expression({"or": [{"gte": {"a": 10}}, {"lt": {"a": 0}}]}))
+        self.assertEqual(result, [])
+
+    def test_intersects(self):
+        r = wrap({"min": 10, "max": 20})
+        self.assertTrue(_intersects(r, "gte", 20))
+        self.assertFalse(_intersects(r, "gt", 20))
+        self.assertTrue(_intersects(r, "lte", 10))
+        self.assertFalse(_intersects(r, "lt", 10))
+        self.assertTrue(_intersects(r, "gt", 0))
+        self.assertFalse(_intersects(r, "lte", 5))
+
 
 class S(object):
     def values(self, name):
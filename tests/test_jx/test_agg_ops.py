@@ -177,6 +177,70 @@ class TestAggOps(BaseTestCase):
         }
         self.utils.execute_tests(test, places=2)
 
+    @skipIf(global_settings.use == "sqlite", "not expected to pass yet")
+    def test_percentile_hdr(self):
+        test = {
+            "data": [{"a": i**2} for i in range(30)],
+            "query": {
+                "from": TEST_TABLE,
+                "select": {"value": "a", "aggregate": "percentile", "percentile": 0.90, "method": "hdr", "accuracy": 3}
+            },
+            "expecting_list": {
+                "meta": {"format": "value"}, "data": 702.5
+            }
+        }
+        self.utils.execute_tests(test, places=1)  # hdr DOES NOT INTERPOLATE, EXPECT A NEIGHBOURING VALUE
+
+    @skipIf(global_settings.use == "sqlite", "not expected to pass yet")
+    def test_many_percentiles(self):
+        test = {
+            "data": [{"a": i**2} for i in range(30)],
+            "query": {
+                "from": TEST_TABLE,
+                "select": [
+                    {"name": "p50", "value": "a", "aggregate": "percentile", "percentile": 0.50},
+                    {"name": "p90", "value": "a", "aggregate": "percentile", "percentile": 0.90},
+                    {"name": "p99", "value": "a", "aggregate": "percentile", "percentile": 0.99},
+                    {"name": "median", "value": "a", "aggregate": "median"}
+                ]
+            },
+            "expecting_list": {
+                "meta": {"format": "value"}, "data": {"p50": 210.5, "p90": 702.5, "p99": 824.5, "median": 210.5}
+            },
+            "expecting_table": {
+                "meta": {"format": "table"},
+                "header": ["p50", "p90", "p99", "median"],
+                "data": [[210.5, 702.5, 824.5, 210.5]]
+            }
+        }
+        self.utils.execute_tests(test, places=1)
+
+    def test_bad_percentile_method(self):
+        test = {
+            "data": [{"a": i**2} for i in range(30)],
+            "query": {
+                "from": TEST_TABLE,
+                "select": {"value": "a", "aggregate": "percentile", "percentile": 0.90, "method": "exact"}
+            },
+            "expecting_list": {
+                "meta": {"format": "value"}, "data": 702.5
+            }
+        }
+        self.assertRaises("Expecting method to be one of", self.utils.execute_tests, test)
+
+    def test_bad_hdr_accuracy(self):
+        test = {
+            "data": [{"a": i**2} for i in range(30)],
+            "query": {
+                "from": TEST_TABLE,
+                "select": {"value": "a", "aggregate": "percentile", "percentile": 0.90, "method": "hdr", "accuracy": 7}
+            },
+            "expecting_list": {
+                "meta": {"format": "value"}, "data": 702.5
+            }
+        }
+        self.assertRaises("Expecting hdr accuracy", self.utils.execute_tests, test)
+
     def test_bad_percentile(self):
         test = {
             "data": [{"a": i**2} for i in range(30)],
@@ -56,3 +56,17 @@ class TestExpressions(FuzzyTestCase):
         result = compile_expression(jx_expression(expr).partial_eval().to_python())(None)
         expected = (Date.today()-MONTH).unix
         self.assertEqual(result, expected)
+
+    def test_compile_is_cached(self):
+        from jx_python.expression_compiler import compile_expression, compile_stats
+
+        source = jx_expression({"add": ["a", 42]}).to_python()
+        first = compile_expression(source)
+        before = compile_stats()
+        second = compile_expression(source)
+        after = compile_stats()
+
+        self.assertIs(first, second)
+        self.assertEqual(after.hits, before.hits + 1)
+        self.assertEqual(after.misses, before.misses)
+        self.assertEqual(second({"a": 1}), 43)
@@ -17,9 +17,17 @@ from unittest import skipIf
 from jx_base.expressions import NULL
 from mo_dots import wrap, set_default
 from mo_future import text_type
+from jx_elasticsearch.es52.aggs import MIN_COMPOSITE_VERSION
 from tests.test_jx import BaseTestCase, TEST_TABLE, global_settings
 
 
+def _es_version():
+    try:
+        return tuple(int(v) for v in global_settings.elasticsearch.version.split(".")[:2])
+    except Exception:
+        return (0, 0)
+
+
 class TestgroupBy1(BaseTestCase):
 
     def test_no_select(self):
@@ -535,6 +543,27 @@ class TestgroupBy1(BaseTestCase):
         }
         self.utils.execute_tests(test)
 
+    @skipIf(global_settings.use == "sqlite", "streaming uses the elasticsearch composite aggregation")
+    @skipIf(_es_version() < MIN_COMPOSITE_VERSION, "composite with missing_bucket requires es6.4")
+    def test_stream_many_groups(self):
+        test = wrap({
+            "data": [{"a": text_type(i), "v": i} for i in range(2500)],
+            "query": {
+                "from": TEST_TABLE,
+                "select": {"value": "v", "aggregate": "sum"},
+                "groupby": "a",
+                "limit": None,
+                "format": "list",
+                "meta": {"stream": True}
+            }
+        })
+
+        self.utils.fill_container(test)
+        result = self.utils.execute_query(test.query)
+        self.assertEqual(len(result.data), 2500)
+        self.assertEqual(set(int(r.a) for r in result.data), set(range(2500)))
+        self.assertEqual(set(r.v for r in result.data), set(range(2500)))
+
 
 # TODO: GROUPBY NUMBER SHOULD NOT RESULT IN A STRING
 #         "groupby":[{
@@ -693,6 +693,41 @@ class TestSetOps(BaseTestCase):
         test.query.format = "list"
         self.assertRaises(Exception, self.utils.execute_query, test.query)
 
+    @skipIf(global_settings.use == "sqlite", "streaming uses the elasticsearch scroll api")
+    def test_stream_all(self):
+        test = wrap({
+            "data": lots_of_data,
+            "query": {
+                "from": TEST_TABLE,
+                "select": {"name": "value", "value": "a"},
+                "limit": None,
+                "format": "list",
+                "meta": {"stream": True}
+            },
+        })
+
+        self.utils.fill_container(test)
+        result = self.utils.execute_query(test.query)
+        self.assertEqual(len(result.data), len(lots_of_data))
+        self.assertEqual(set(result.data), set(lots_of_data.a))
+
+    @skipIf(global_settings.use == "sqlite", "streaming uses the elasticsearch scroll api")
+    def test_stream_limit(self):
+        test = wrap({
+            "data": lots_of_data,
+            "query": {
+                "from": TEST_TABLE,
+                "select": {"name": "value", "value": "a"},
+                "limit": 7,
+                "format": "list",
+                "meta": {"stream": True}
+            },
+        })
+
+        self.utils.fill_container(test)
+        result = self.utils.execute_query(test.query)
+        self.assertEqual(len(result.data), 7)
+
     def test_select_w_star(self):
         test = {
             "data": [
@@ -1149,6 +1184,40 @@ class TestSetOps(BaseTestCase):
         }
         self.utils.execute_tests(test)
 
+    def test_select_single_value_arrays(self):
+        # A LARGE limit PARSES THE HITS AS THEY ARRIVE, WHICH MUST GIVE THE SAME VALUES
+        test = {
+            "data": [
+                {"a": [5], "b": 1},
+                {"a": [], "b": 2},
+                {"a": [7, 8], "b": 3}
+            ],
+            "query": {
+                "from": TEST_TABLE,
+                "select": ["a", "b"],
+                "sort": "b",
+                "limit": 10000
+            },
+            "expecting_list": {
+                "meta": {"format": "list"},
+                "data": [
+                    {"a": 5, "b": 1},
+                    {"a": NULL, "b": 2},
+                    {"a": [7, 8], "b": 3}
+                ]
+            },
+            "expecting_table": {
+                "meta": {"format": "table"},
+                "header": ["a", "b"],
+                "data": [
+                    [5, 1],
+                    [NULL, 2],
+                    [[7, 8], 3]
+                ]
+            }
+        }
+        self.utils.execute_tests(test)
+
     def test_select_w_nested_values(self):
         test = {
             "data": [
@@ -0,0 +1,83 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+from itertools import product
+from unittest import skipIf
+
+from mo_collections import matrix
+from mo_collections.matrix import Coverage, Matrix, all_coordinates
+from mo_testing.fuzzytestcase import FuzzyTestCase
+
+DIMS = [(), (1,), (5,), (0,), (3, 0), (0, 3), (2, 3), (3, 1, 4), (2, 0, 2)]
+
+
+class TestMatrix(FuzzyTestCase):
+
+    def test_all_coordinates(self):
+        for dims in DIMS:
+            self.assertListEqual(list(all_coordinates(dims)), _brute_coordinates(dims), repr(dims))
+
+    def test_missing_without_numpy(self):
+        for dims, coverage, added in _coverages():
+            self.assertListEqual(list(coverage._missing()), _brute_missing(dims, added), repr(dims))
+
+    @skipIf(matrix.numpy is None, "numpy is not installed")
+    def test_missing_with_numpy(self):
+        for dims, coverage, added in _coverages():
+            self.assertListEqual(list(coverage.missing()), _brute_missing(dims, added), repr(dims))
+
+    def test_missing(self):
+        # WHICHEVER PATH IS AVAILABLE
+        for dims, coverage, added in _coverages():
+            self.assertListEqual(list(coverage.missing()), _brute_missing(dims, added), repr(dims))
+
+    def test_items(self):
+        for dims in DIMS:
+            if not dims:
+                continue
+            m = Matrix(dims=dims, zeros=0)
+            for c in _brute_coordinates(dims):
+                m[c] = c
+            self.assertListEqual(list(m.items()), [(c, c) for c in _brute_coordinates(dims)], repr(dims))
+
+    def test_items_of_value(self):
+        self.assertListEqual(list(Matrix(value=42).items()), [((), 42)])
+
+
+def _coverages():
+    """
+    :return: (dims, coverage, added) FOR A FEW PATTERNS OF add()ED CELLS, FOR EACH OF DIMS
+    """
+    patterns = [
+        lambda i: False,
+        lambda i: True,
+        lambda i: i % 2,
+        lambda i: i % 3 == 0
+    ]
+    for dims in DIMS:
+        for pattern in patterns:
+            coverage = Coverage(dims)
+            added = set()
+            for i, c in enumerate(_brute_coordinates(dims)):
+                if pattern(i):
+                    coverage.add(c)
+                    added.add(c)
+            yield dims, coverage, added
+
+
+def _brute_coordinates(dims):
+    return list(product(*(range(d) for d in dims)))
+
+
+def _brute_missing(dims, added):
+    return [c for c in _brute_coordinates(dims) if c not in added]
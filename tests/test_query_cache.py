@@ -0,0 +1,114 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+import os
+import tempfile
+
+from active_data.actions import query_cache
+from active_data.actions.query_cache import QueryCache
+from mo_dots import Data, wrap
+from mo_testing.fuzzytestcase import FuzzyTestCase
+from mo_times import Date
+
+
+class TestQueryCache(FuzzyTestCase):
+
+    def test_miss_then_hit(self):
+        cache = QueryCache()
+        self.assertEqual(cache.get("k", 1), None)
+        cache.set("k", 1, {"format": "list"}, b'{"data":[1]')
+        entry = cache.get("k", 1)
+        self.assertEqual(entry.body, b'{"data":[1]')
+        self.assertEqual(entry.meta, {"format": "list"})
+        self.assertEqual(cache.stats(entry), {"hit": True, "hits": 1, "misses": 1, "bytes": 11, "total_bytes": 11})
+
+    def test_new_version_invalidates(self):
+        cache = QueryCache()
+        cache.set("k", 1, {}, b"abc")
+        self.assertEqual(cache.get("k", 2), None)
+        self.assertEqual(cache.num_bytes, 0, "stale entry is removed")
+        self.assertEqual(cache.get("k", 1), None, "stale entry is gone")
+
+    def test_expired_entry_is_a_miss(self):
+        cache = QueryCache(ttl=-1)
+        cache.set("k", 1, {}, b"abc")
+        self.assertEqual(cache.get("k", 1), None)
+        self.assertEqual(cache.misses, 1)
+
+    def test_least_recently_used_evicted(self):
+        cache = QueryCache(max_bytes=6)
+        cache.set("a", 1, {}, b"aaa")
+        cache.set("b", 1, {}, b"bbb")
+        cache.get("a", 1)
+        cache.set("c", 1, {}, b"ccc")
+        self.assertEqual(list(cache.entries.keys()), ["a", "c"])
+        self.assertEqual(cache.num_bytes, 6)
+
+    def test_big_response_not_cached(self):
+        cache = QueryCache(max_entry_bytes=2)
+        cache.set("k", 1, {}, b"abc")
+        self.assertEqual(cache.get("k", 1), None)
+
+    def test_replace_entry(self):
+        cache = QueryCache()
+        cache.set("k", 1, {}, b"abc")
+        cache.set("k", 2, {}, b"abcdef")
+        self.assertEqual(cache.num_bytes, 6)
+        self.assertEqual(cache.get("k", 2).body, b"abcdef")
+
+    def test_shared_between_caches(self):
+        handle, filename = tempfile.mkstemp(suffix=".sqlite")
+        os.close(handle)
+        try:
+            first = QueryCache(sql_file=filename)
+            second = QueryCache(sql_file=filename)
+            first.set("k", 1, {"format": "table"}, b'{"data":"\xe2\x9c\x93"')
+            entry = second.get("k", 1)
+            self.assertEqual(entry.body, b'{"data":"\xe2\x9c\x93"')
+            self.assertEqual(entry.meta, {"format": "table"})
+            self.assertEqual(second.get("k", 2), None, "other version is a miss")
+        finally:
+            os.remove(filename)
+
+    def test_key_depends_on_query(self):
+        cache = QueryCache()
+        container = _container({"test": Date("2018-01-01")})
+        key1, version = cache.get_key(_query(limit=10), container)
+        key2, _ = cache.get_key(_query(limit=10), container)
+        key3, _ = cache.get_key(_query(limit=20), container)
+        self.assertEqual(key1, key2)
+        self.assertNotEqual(key1, key3)
+        self.assertEqual(version, Date("2018-01-01").unix)
+
+    def test_version_is_latest_index_change(self):
+        container = _container({"test": Date("2018-01-01"), "test_2": Date("2018-02-01"), "other": Date("2018-03-01")})
+        self.assertEqual(query_cache._get_version(container), Date("2018-02-01").unix)
+
+    def test_not_es_can_not_be_cached(self):
+        cache = QueryCache()
+        self.assertEqual(cache.get_key(_query(), Data()), (None, None))
+
+
+def _query(limit=10):
+    return Data(frum=Data(name="test"), select={"value": "a"}, limit=limit, format="list")
+
+
+def _container(last_updated):
+    indices = {
+        "test": {"aliases": []},
+        "test_2": {"aliases": ["test"]},
+        "other": {"aliases": []}
+    }
+    cluster = Data(index_last_updated=last_updated)
+    cluster.get_metadata = lambda: wrap({"indices": indices})
+    return Data(es=Data(cluster=cluster, settings={"alias": "test"}))
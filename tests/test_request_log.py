@@ -0,0 +1,138 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+import os
+import tempfile
+
+from active_data.request_log import RequestLogQueue
+from mo_collections.persistent_queue import PersistentQueue
+from mo_logs import Log
+from mo_testing.fuzzytestcase import FuzzyTestCase
+from mo_threads import Signal, Thread, Till, THREAD_STOP
+
+TIMEOUT = 10  # SECONDS TO WAIT FOR THE SENDER THREAD
+
+
+class TestRequestLog(FuzzyTestCase):
+
+    def setUp(self):
+        handle, self.filename = tempfile.mkstemp(suffix=".queue")
+        os.close(handle)
+        os.remove(self.filename)
+
+    def tearDown(self):
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+    def test_overflow_dropped_and_counted(self):
+        index = Index(accept=False)  # THE SENDER IS STUCK ON THE FIRST BATCH
+        queue = RequestLogQueue(index=index, max_size=3, batch_size=1, period=0.01)
+        try:
+            queue.add(0)
+            _wait_for(lambda: index.attempts)
+            for i in range(1, 6):
+                queue.add(i)
+            self.assertEqual(queue.stats()["dropped"], 2)
+            self.assertEqual(queue.stats()["buffered"], 3)
+
+            index.accept.go()
+            _wait_for(lambda: queue.stats()["sent"] == 4)
+            self.assertEqual(index.received, [0, 3, 4, 5], "oldest are dropped")
+        finally:
+            queue.stop()
+
+    def test_spill_then_replay_in_order(self):
+        index = Index()
+        index.fail = "connection refused"
+        queue = RequestLogQueue(index=index, max_size=100, batch_size=2, period=0.01, spill_file=self.filename)
+        try:
+            for i in range(6):
+                queue.add(i)
+            _wait_for(lambda: queue.stats()["spilled"] == 6)
+            self.assertEqual(index.received, [])
+            queue.add(6)
+
+            index.fail = None
+            _wait_for(lambda: queue.stats()["sent"] == 7)
+            self.assertEqual(index.received, list(range(7)))
+        finally:
+            queue.stop()
+
+    def test_hopeless_dropped(self):
+        index = Index()
+        index.fail = "400 MapperParsingException[failed to parse]"
+        queue = RequestLogQueue(index=index, max_size=100, batch_size=2, period=0.01)
+        try:
+            for i in range(4):
+                queue.add(i)
+            _wait_for(lambda: queue.stats()["dropped"] == 4)
+            attempts = index.attempts
+            Till(seconds=0.1).wait()
+            self.assertEqual(index.attempts, attempts, "not tried again")
+            self.assertEqual(queue.stats()["sent"], 0)
+        finally:
+            queue.stop()
+
+    def test_spill_file_reopened(self):
+        queue = PersistentQueue(self.filename)
+        for i in range(3):
+            queue.add({"value": i})
+        queue.pop()
+        queue.commit()
+        queue.pop()
+        queue.rollback()  # NOT SENT, SO NOT LOST
+        queue.close()
+        self.assertTrue(queue.closed)
+
+        queue = PersistentQueue(self.filename)
+        self.assertEqual(len(queue), 2)
+        self.assertEqual([queue.pop(), queue.pop()], [{"value": 1}, {"value": 2}])
+        queue.commit()
+        queue.close()
+        self.assertFalse(os.path.exists(self.filename), "empty queue file is removed")
+
+    def test_close_releases_waiting_pop(self):
+        queue = PersistentQueue(self.filename)
+        popper = Thread.run("pop", lambda please_stop: queue.pop())
+        Till(seconds=0.1).wait()
+        queue.close()
+        self.assertEqual(popper.join(till=Till(seconds=TIMEOUT)), THREAD_STOP)
+
+
+class Index(object):
+    """
+    PRETEND ES Index
+    """
+
+    def __init__(self, accept=True):
+        self.accept = Signal()
+        if accept:
+            self.accept.go()
+        self.fail = None  # ERROR TO RAISE
+        self.attempts = 0
+        self.received = []
+
+    def extend(self, records):
+        self.attempts += 1
+        self.accept.wait()
+        if self.fail:
+            Log.error(self.fail)
+        self.received.extend(r["value"] for r in records)
+
+
+def _wait_for(condition):
+    till = Till(seconds=TIMEOUT)
+    while not condition():
+        if till:
+            Log.error("Timeout waiting for the request log sender")
+        Till(seconds=0.01).wait()
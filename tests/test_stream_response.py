@@ -0,0 +1,88 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+from collections import OrderedDict
+
+from active_data import actions
+from active_data.actions import stream_response
+from mo_dots import Data
+from mo_json import json2value
+from mo_logs import Log
+from mo_testing.fuzzytestcase import FuzzyTestCase
+from mo_times import Timer
+
+
+class TestStreamResponse(FuzzyTestCase):
+
+    def setUp(self):
+        self.batch_size = actions.STREAM_BATCH_SIZE
+        actions.STREAM_BATCH_SIZE = 2
+
+    def tearDown(self):
+        actions.STREAM_BATCH_SIZE = self.batch_size
+
+    def test_list(self):
+        result = Data(
+            meta={"format": "list", "timing": {"trace": OrderedDict([("es", 0.5)])}},
+            data=(r for r in [{"a": 1}, {"a": 2}, {"a": 3}])
+        )
+        chunks = list(stream_response(result, _timer()))
+        self.assertGreater(len(chunks), 3, "expecting the rows to be sent in batches")
+
+        response = json2value(b"".join(chunks).decode("utf8"))
+        self.assertEqual(response.data, [{"a": 1}, {"a": 2}, {"a": 3}])
+        self.assertEqual(response.meta.format, "list")
+        self.assertGreaterEqual(response.meta.timing.jsonification, 0)
+        self.assertGreaterEqual(response.meta.timing.total, response.meta.timing.jsonification)
+        self.assertEqual(response.meta.timing.trace.es, 0.5)
+        self.assertEqual(response.meta.timing.trace.jsonification, response.meta.timing.jsonification)
+
+    def test_empty_list(self):
+        result = Data(meta={"format": "list"}, data=[])
+        response = json2value(b"".join(stream_response(result, _timer())).decode("utf8"))
+        self.assertEqual(response, {"data": [], "meta": {"format": "list"}})
+
+    def test_cube(self):
+        result = Data(meta={"format": "cube"}, edges=[], data={"a": [1, 2], "b": [3, 4]})
+        response = json2value(b"".join(stream_response(result, _timer())).decode("utf8"))
+        self.assertEqual(response.data, {"a": [1, 2], "b": [3, 4]})
+
+    def test_error_after_first_batch(self):
+        def rows():
+            yield {"a": 1}
+            yield {"a": 2}
+            yield {"a": 3}
+            Log.error("problem reading rows")
+
+        result = Data(meta={"format": "list"}, data=rows())
+        response = json2value(b"".join(stream_response(result, _timer())).decode("utf8"))
+        self.assertEqual(response.data, [{"a": 1}, {"a": 2}])
+        self.assertIn("problem reading rows", response.error.template)
+        self.assertEqual(response.meta, None, "no meta after an error")
+
+    def test_error_before_first_row(self):
+        def rows():
+            Log.error("problem reading rows")
+            yield
+
+        result = Data(meta={"format": "list"}, data=rows())
+        response = json2value(b"".join(stream_response(result, _timer())).decode("utf8"))
+        self.assertEqual(response.data, None)
+        self.assertIn("problem reading rows", response.error.template)
+
+
+def _timer():
+    with Timer("test") as timer:
+        pass
+    return timer
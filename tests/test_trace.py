@@ -0,0 +1,112 @@
+# encoding: utf-8
+#
+#
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+#
+# Author: Kyle Lahnakoski (kyle@lahnakoski.com)
+#
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import unicode_literals
+
+from mo_testing.fuzzytestcase import FuzzyTestCase
+from mo_threads import Thread, Till
+
+from pyLibrary import trace
+
+
+class TestTrace(FuzzyTestCase):
+
+    def tearDown(self):
+        trace.stop()
+
+    def test_not_collecting(self):
+        trace.add("es", 1)
+        with trace.timed("formatting"):
+            pass
+        self.assertEqual(trace.stop(), None)
+
+    def test_steps_in_order_seen(self):
+        trace.start()
+        trace.add("b", 1)
+        trace.add("a", 2)
+        trace.add("b", 3)
+        self.assertEqual(list(trace.stop().items()), [("b", 4), ("a", 2)])
+
+    def test_timed_nesting_not_counted_twice(self):
+        trace.start()
+        with trace.timed("outer"):
+            Till(seconds=0.1).wait()
+            with trace.timed("inner"):
+                Till(seconds=0.2).wait()
+            Till(seconds=0.1).wait()
+            trace.add("es", 0.1)  # eg THE http_wait OF A REQUEST
+        steps = trace.stop()
+        self.assertAlmostEqual(steps["inner"], 0.2, delta=0.05)
+        self.assertAlmostEqual(steps["outer"], 0.1, delta=0.05, msg="inner and es are not outer")
+        self.assertEqual(steps["es"], 0.1)
+
+    def test_timed_nesting_same_step(self):
+        trace.start()
+        with trace.timed("normalize"):
+            with trace.timed("normalize"):
+                Till(seconds=0.1).wait()
+        self.assertAlmostEqual(trace.stop()["normalize"], 0.1, delta=0.05)
+
+    def test_add_after(self):
+        trace.start()
+        trace.add("es", 0.5)
+        meta = {"timing": {"trace": trace.stop()}}
+        trace.add_after(meta, "jsonification", 0.25)
+        trace.add_after(meta, "jsonification", 0.25)
+        self.assertEqual(list(meta["timing"]["trace"].items()), [("es", 0.5), ("jsonification", 0.5)])
+        self.assertEqual(trace.spent(meta), 1)
+
+    def test_add_after_without_trace(self):
+        meta = {"timing": {}}
+        trace.add_after(meta, "jsonification", 1)
+        trace.add_after(None, "jsonification", 1)
+        self.assertEqual(meta, {"timing": {}})
+        self.assertEqual(trace.spent(meta), 0)
+
+    def test_using_after_stop(self):
+        trace.start()
+        steps = trace.current()
+        trace.add("es", 1)
+        meta = {"timing": {"trace": trace.stop()}}
+
+        with trace.using(steps):
+            trace.add("es", 2)
+        trace.add("es", 4)  # NOT COLLECTING
+        self.assertEqual(meta["timing"]["trace"], {"es": 3})
+
+    def test_using_restores_outer(self):
+        trace.start()
+        other = trace.current()
+        trace.stop()
+
+        trace.start()
+        with trace.timed("outer"):
+            with trace.using(other):
+                trace.add("es", 10)
+        steps = trace.stop()
+        self.assertEqual(other, {"es": 10})
+        self.assertLess(steps["outer"], 1, "time in other trace is not inner to outer")
+
+    def test_merge_worker_threads(self):
+        traces = []
+
+        def worker(please_stop):
+            trace.start()
+            trace.add("http_wait", 1)
+            traces.append(trace.stop())
+
+        trace.start()
+        trace.add("es_translate", 1)
+        for t in [Thread.run("worker " + str(i), worker) for i in range(3)]:
+            t.join()
+        for steps in traces:
+            trace.merge(steps)
+        self.assertEqual(trace.stop(), {"es_translate": 1, "http_wait": 3})